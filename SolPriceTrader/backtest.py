@@ -0,0 +1,89 @@
+"""
+Compiled mean reversion kernel for replaying historical prices offline
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; fall back to running the kernel as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# Column layout of the trade ledger returned by simulate()
+TRADE_INDEX, TRADE_ACTION, TRADE_PRICE, TRADE_QUANTITY, TRADE_SLIPPAGE, \
+    TRADE_TOTAL_VALUE, TRADE_PNL, TRADE_CUMULATIVE_PNL, TRADE_MA_VALUE = range(9)
+TRADE_COLUMNS = 9
+
+ACTION_BUY = 0
+ACTION_SELL = 1
+
+@njit(cache=True)
+def simulate(prices, ma_period, initial_cash, slippage_rate):
+    """
+    Run the mean reversion strategy over an array of prices
+    Returns (trades, equity): a (n_trades, TRADE_COLUMNS) ledger and the total value at each tick
+    """
+    n = prices.shape[0]
+    trades = np.empty((n, TRADE_COLUMNS), dtype=np.float64)
+    equity = np.empty(n, dtype=np.float64)
+    n_trades = 0
+
+    cash = float(initial_cash)
+    sol_quantity = 0.0
+    cost_basis = 0.0
+    position = 0  # 0=cash, 1=sol
+    ma_sum = 0.0
+    buy_factor = 1 + slippage_rate
+    sell_factor = 1 - slippage_rate
+
+    for i in range(n):
+        price = prices[i]
+        ma_sum += price
+        if i >= ma_period:
+            ma_sum -= prices[i - ma_period]
+
+        if i + 1 >= ma_period:
+            ma_value = ma_sum / ma_period
+            action = -1
+            effective_price = quantity = slippage = pnl = 0.0
+
+            if price < ma_value and position == 0 and cash > 0:
+                effective_price = price * buy_factor
+                slippage = effective_price - price
+                quantity = cash / effective_price
+                cash -= quantity * effective_price
+                sol_quantity = quantity
+                cost_basis = effective_price
+                position = 1
+                action = ACTION_BUY
+
+            elif price > ma_value and position == 1 and sol_quantity > 0:
+                effective_price = price * sell_factor
+                slippage = price - effective_price
+                quantity = sol_quantity
+                pnl = (effective_price - cost_basis) * quantity
+                cash += quantity * effective_price
+                sol_quantity = 0.0
+                cost_basis = 0.0
+                position = 0
+                action = ACTION_SELL
+
+            if action >= 0:
+                total_value = cash + sol_quantity * price
+                trades[n_trades, TRADE_INDEX] = i
+                trades[n_trades, TRADE_ACTION] = action
+                trades[n_trades, TRADE_PRICE] = effective_price
+                trades[n_trades, TRADE_QUANTITY] = quantity
+                trades[n_trades, TRADE_SLIPPAGE] = slippage
+                trades[n_trades, TRADE_TOTAL_VALUE] = total_value
+                trades[n_trades, TRADE_PNL] = pnl
+                trades[n_trades, TRADE_CUMULATIVE_PNL] = total_value - initial_cash
+                trades[n_trades, TRADE_MA_VALUE] = ma_value
+                n_trades += 1
+
+        equity[i] = cash + sol_quantity * price
+
+    return trades[:n_trades], equity
@@ -1,11 +1,21 @@
 """
-Data fetcher for Jupiter API to get SOL/USDC prices
+Data fetchers for Jupiter API (REST) and Pyth Hermes (streaming) SOL/USDC prices
 """
 
 import requests
 import json
+import queue
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Top-level quote amount, matched on the raw body to skip parsing the route plan
+OUT_AMOUNT_PATTERN = re.compile(rb'"outAmount"\s*:\s*"(\d+)"')
 
 class JupiterDataFetcher:
     """Fetches SOL/USDC price data from Jupiter API"""
@@ -16,79 +26,192 @@ class JupiterDataFetcher:
         self.usdc_mint = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"  # USDC mint address
         self.amount = 1000000000  # 1 SOL in lamports (1 SOL = 1e9 lamports)
         
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 1  # Minimum 1 second between requests
+        # Quote request parameters (direct routes keep the routePlan payload small)
+        self.quote_params = {
+            'inputMint': self.sol_mint,
+            'outputMint': self.usdc_mint,
+            'amount': self.amount,
+            'slippageBps': 50,  # 0.5% slippage tolerance
+            'onlyDirectRoutes': 'true',
+            'restrictIntermediateTokens': 'true'
+        }
+        
+        # Adaptive token-bucket rate limiting (tokens refill at `rate` per second)
+        self.capacity = 5
+        self.tokens = 5.0
+        self.rate = 1.0
+        self.min_rate = 0.1  # Floor the refill rate can be halved down to
+        self.max_rate = 2.0  # Ceiling the refill rate can recover up to
+        self.rate_step = 0.1  # Refill rate recovered per successful request
+        self.last_refill = time.monotonic()
+        self.last_congestion_time = None
+        self._rate_lock = threading.Lock()  # Token bucket is shared by get_prices workers
+        
+        # Application-level retries own HTTP status retries (429/5xx, honoring Retry-After) so every
+        # attempt goes through the token bucket
+        self.max_attempts = 5
+        self.max_backoff = 10  # Seconds
+        
+        # Short-lived quote cache keyed by (inputMint, outputMint, amount)
+        self._cache = {}
+        self._ttl = 5  # Seconds a cached quote stays fresh
+        
+        # Reuse one keep-alive connection pool instead of a new TCP+TLS handshake per poll
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = 'SOL-USDC-Trading-Simulator/1.0'
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        # urllib3 only retries connection-level failures; status retries are left to _fetch_quote_price
+        retry = Retry(total=3, backoff_factor=0.3, respect_retry_after_header=False)
+        self.session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=retry))
+        
+        # Workers for concurrent multi-pair quotes (threads are only spawned on first use)
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='jupiter-quote')
         
         print(f"Initialized Jupiter data fetcher")
         print(f"  SOL Mint: {self.sol_mint}")
         print(f"  USDC Mint: {self.usdc_mint}")
         print(f"  Quote Amount: {self.amount / 1e9} SOL")
     
+    def _acquire_token(self):
+        """Block until the token bucket allows another request"""
+        with self._rate_lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            
+            if self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.last_refill = time.monotonic()
+            
+            self.tokens -= 1
+    
+    def _on_success(self):
+        """Recover the refill rate after a successful request"""
+        self.rate = min(self.rate + self.rate_step, self.max_rate)
+    
+    def _on_congestion(self):
+        """Halve the refill rate when the API is rate limiting or degraded"""
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self.last_congestion_time = time.monotonic()
+    
+    def _backoff(self, attempt, retry_after=None):
+        """Sleep with jittered exponential backoff (or the server's Retry-After) before retrying"""
+        if retry_after is not None and retry_after.isdigit():
+            delay = min(float(retry_after), self.max_backoff)
+        else:
+            delay = min(2 ** attempt + random.random() * 0.5, self.max_backoff)
+        print(f"⏳ Retrying in {delay:.1f}s (attempt {attempt + 2}/{self.max_attempts})...")
+        time.sleep(delay)
+    
+    def _extract_out_amount(self, response):
+        """
+        Get the top-level outAmount from a quote response
+        Scans the raw bytes first and only falls back to a full JSON parse when needed
+        """
+        body = response.content
+        match = OUT_AMOUNT_PATTERN.search(body)
+        if match:
+            # Per-hop swapInfo entries also carry outAmount, so only trust a match ahead of the route plan
+            route_plan_pos = body.find(b'"routePlan"')
+            if route_plan_pos == -1 or match.start() < route_plan_pos:
+                return match.group(1)
+        
+        return response.json().get('outAmount')
+    
     def get_sol_usdc_price(self):
         """
         Fetch SOL to USDC price from Jupiter API
         Returns the price of 1 SOL in USDC
         """
-        try:
-            # Rate limiting
-            current_time = time.time()
-            if current_time - self.last_request_time < self.min_request_interval:
-                time.sleep(self.min_request_interval - (current_time - self.last_request_time))
-            
-            # Prepare request parameters
-            params = {
-                'inputMint': self.sol_mint,
-                'outputMint': self.usdc_mint,
-                'amount': self.amount,
-                'slippageBps': 50  # 0.5% slippage tolerance
-            }
-            
-            # Make the request
-            response = requests.get(
-                self.base_url,
-                params=params,
-                timeout=10,
-                headers={'User-Agent': 'SOL-USDC-Trading-Simulator/1.0'}
+        return self._fetch_quote_price(self.quote_params, input_decimals=9, output_decimals=6)
+    
+    def get_prices(self, pairs):
+        """
+        Quote several pairs concurrently over the pooled session
+        pairs: iterable of (input_mint, output_mint, input_decimals, output_decimals)
+        Returns {(input_mint, output_mint): price of 1 input token, or None on failure}
+        """
+        futures = {}
+        for input_mint, output_mint, input_decimals, output_decimals in pairs:
+            params = dict(self.quote_params, inputMint=input_mint, outputMint=output_mint,
+                          amount=10 ** input_decimals)
+            futures[(input_mint, output_mint)] = self._pool.submit(
+                self._fetch_quote_price, params, input_decimals, output_decimals
             )
+        
+        return {pair: future.result() for pair, future in futures.items()}
+    
+    def _fetch_quote_price(self, params, input_decimals, output_decimals):
+        """Fetch one quote and return the output amount per whole input token"""
+        # Serve repeated calls within the TTL window from cache
+        cache_key = (params['inputMint'], params['outputMint'], params['amount'])
+        cached = self._cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[1] < self._ttl:
+            return cached[0]
+        
+        retry_after = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self._backoff(attempt - 1, retry_after)
+                retry_after = None
             
-            self.last_request_time = time.time()
-            
-            if response.status_code == 200:
-                data = response.json()
+            try:
+                # Rate limiting
+                self._acquire_token()
                 
-                # Extract the output amount (USDC received for 1 SOL)
-                if 'outAmount' in data:
-                    # USDC has 6 decimals, so divide by 1e6
-                    usdc_amount = int(data['outAmount']) / 1e6
-                    sol_amount = self.amount / 1e9  # Convert lamports to SOL
-                    
-                    price = usdc_amount / sol_amount
+                # Make the request
+                response = self.session.get(
+                    self.base_url,
+                    params=params,
+                    timeout=10
+                )
+                
+                if response.status_code == 200:
+                    out_amount = self._extract_out_amount(response)
                     
-                    return price
+                    # Extract the output amount (e.g. USDC received for 1 SOL)
+                    if out_amount is not None:
+                        # Convert base units using each token's decimals (SOL 9, USDC 6)
+                        output_amount = int(out_amount) / 10 ** output_decimals
+                        input_amount = params['amount'] / 10 ** input_decimals
+                        
+                        price = output_amount / input_amount
+                        
+                        self._on_success()
+                        self._cache[cache_key] = (price, time.monotonic())
+                        return price
+                    else:
+                        print(f"❌ Unexpected API response format: {response.text}")
+                        return None
+                
                 else:
-                    print(f"❌ Unexpected API response format: {data}")
+                    print(f"❌ API request failed with status {response.status_code}: {response.text}")
+                    if response.status_code == 429 or response.status_code >= 500:
+                        self._on_congestion()
+                        retry_after = response.headers.get('Retry-After')
+                        continue
                     return None
-            
-            else:
-                print(f"❌ API request failed with status {response.status_code}: {response.text}")
+                    
+            except requests.exceptions.Timeout:
+                print("❌ Request timeout - Jupiter API is slow to respond")
+                continue
+            except requests.exceptions.ConnectionError:
+                self._on_congestion()
+                print("❌ Connection error - Check internet connection")
+                continue
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Request error: {e}")
                 return None
-                
-        except requests.exceptions.Timeout:
-            print("❌ Request timeout - Jupiter API is slow to respond")
-            return None
-        except requests.exceptions.ConnectionError:
-            print("❌ Connection error - Check internet connection")
-            return None
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Request error: {e}")
-            return None
-        except json.JSONDecodeError:
-            print("❌ Invalid JSON response from API")
-            return None
-        except Exception as e:
-            print(f"❌ Unexpected error fetching price: {e}")
-            return None
+            except json.JSONDecodeError:
+                print("❌ Invalid JSON response from API")
+                return None
+            except Exception as e:
+                print(f"❌ Unexpected error fetching price: {e}")
+                return None
+        
+        print(f"❌ Giving up after {self.max_attempts} attempts")
+        return None
     
     def test_connection(self):
         """Test the connection to Jupiter API"""
@@ -101,3 +224,124 @@ class JupiterDataFetcher:
         else:
             print("❌ Connection test failed")
             return False
+
+
+class JupiterPollingFetcher(JupiterDataFetcher):
+    """Polls Jupiter REST quotes on a background thread and pushes prices to a queue"""
+    
+    def __init__(self, poll_interval=30, max_queue_size=100):
+        super().__init__()
+        self.poll_interval = poll_interval
+        
+        self.price_queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the background fetch thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background fetch thread"""
+        self._stop_event.set()
+    
+    def get_next_price(self, timeout=None):
+        """
+        Block until the next pushed price arrives
+        Returns None if nothing arrives within the timeout
+        """
+        try:
+            return self.price_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def _publish(self, price):
+        """Push a price to consumers, dropping the oldest if they fall behind"""
+        while True:
+            try:
+                self.price_queue.put_nowait(price)
+                return
+            except queue.Full:
+                try:
+                    self.price_queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def _run_loop(self):
+        """Fetch a quote every poll interval until stopped"""
+        while not self._stop_event.is_set():
+            # Schedule against the monotonic clock so fetch time doesn't stretch the cadence
+            deadline = time.monotonic() + self.poll_interval
+            
+            price = self.get_sol_usdc_price()
+            if price is not None:
+                self._publish(price)
+            
+            self._stop_event.wait(max(0, deadline - time.monotonic()))
+
+
+class JupiterStreamFetcher(JupiterPollingFetcher):
+    """Pushes SOL/USD price updates from the Pyth Hermes SSE stream, with Jupiter REST fallback"""
+    
+    def __init__(self, poll_interval=30, max_queue_size=100):
+        super().__init__(poll_interval, max_queue_size)
+        self.stream_url = "https://hermes.pyth.network/v2/updates/price/stream"
+        self.price_feed_id = "ef0d8b6fda2ceba41da15d4095d1da392a0d2f8ed0c6c7bc0f4cfac8c280b56d"  # Pyth SOL/USD feed
+        self.reconnect_delay = 5  # Seconds to wait before reconnecting a dropped stream
+        self.is_streaming = False
+        
+        print(f"  Price Stream: {self.stream_url}")
+    
+    def _parse_event(self, payload):
+        """Extract the SOL/USD price from a Hermes SSE data payload"""
+        data = json.loads(payload)
+        for update in data.get('parsed', []):
+            if update.get('id') == self.price_feed_id:
+                price_info = update['price']
+                return int(price_info['price']) * 10 ** int(price_info['expo'])
+        return None
+    
+    def _run_loop(self):
+        """Consume the SSE stream, falling back to REST quotes while disconnected"""
+        params = {'ids[]': self.price_feed_id, 'parsed': 'true'}
+        
+        while not self._stop_event.is_set():
+            try:
+                with self.session.get(self.stream_url, params=params, stream=True, timeout=(10, 60)) as response:
+                    response.raise_for_status()
+                    self.is_streaming = True
+                    print("✅ Connected to price stream")
+                    
+                    for line in response.iter_lines():
+                        if self._stop_event.is_set():
+                            return
+                        if not line.startswith(b'data:'):
+                            continue
+                        
+                        # A malformed event is skipped; it shouldn't cost the live connection
+                        try:
+                            price = self._parse_event(line[5:])
+                        except (json.JSONDecodeError, KeyError, ValueError) as e:
+                            print(f"❌ Invalid price stream event: {e}")
+                            continue
+                        if price is not None:
+                            self._publish(price)
+            
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Price stream error: {e}")
+            
+            self.is_streaming = False
+            if self._stop_event.is_set():
+                return
+            
+            # Keep consumers fed from REST until the stream reconnects
+            print(f"⚠️ Price stream disconnected, falling back to REST for {self.reconnect_delay}s...")
+            price = self.get_sol_usdc_price()
+            if price is not None:
+                self._publish(price)
+            self._stop_event.wait(self.reconnect_delay)
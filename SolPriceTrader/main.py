@@ -3,6 +3,8 @@
 Main entry point for the SOL/USDC Mean Reversion Trading Simulator
 """
 
+import argparse
+import logging
 import time
 import signal
 import sys
@@ -15,6 +17,17 @@ def signal_handler(sig, frame):
 
 def main():
     """Main function to run the trading simulator"""
+    parser = argparse.ArgumentParser(description="SOL/USDC Mean Reversion Trading Simulator")
+    parser.add_argument('--stream', action='store_true',
+                        help="React to pushed price updates instead of polling every fetch interval")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="Per-tick status and trades log at INFO; use WARNING to silence them")
+    parser.add_argument('--disp-skip', type=int, default=1,
+                        help="Render only every Nth chart update (raised automatically while rendering is slow)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    
     print("=" * 60)
     print("SOL/USDC Mean Reversion Trading Simulator")
     print("=" * 60)
@@ -29,7 +42,9 @@ def main():
         initial_cash=10000,  # Start with $10,000 USDC
         ma_period=20,        # 20-period moving average
         fetch_interval=30,   # Fetch every 30 seconds
-        slippage_rate=0.001  # 0.1% slippage
+        slippage_rate=0.001, # 0.1% slippage
+        use_stream=args.stream,
+        disp_skip=args.disp_skip
     )
     
     try:
@@ -2,11 +2,33 @@
 Portfolio management for tracking cash, SOL holdings, and calculating PnL
 """
 
+from collections import namedtuple
+from dataclasses import dataclass
 from datetime import datetime
 
+# Result of a single buy/sell (total is cost for buys, proceeds for sells)
+TradeResult = namedtuple('TradeResult', 'action quantity price total remaining_cash sol_holdings')
+
+@dataclass(slots=True)
+class PortfolioSummary:
+    """Point-in-time snapshot of portfolio value and PnL"""
+    cash: float
+    sol_quantity: float
+    sol_cost_basis: float
+    sol_current_price: float
+    sol_market_value: float
+    total_value: float
+    initial_cash: float
+    total_pnl: float
+    total_pnl_pct: float
+    unrealized_pnl: float
+    trades_count: int
+
 class Portfolio:
     """Manages portfolio state including cash and SOL holdings"""
     
+    __slots__ = ('initial_cash', 'cash', 'sol_quantity', 'sol_cost_basis', 'trades_count')
+    
     def __init__(self, initial_cash):
         self.initial_cash = initial_cash
         self.cash = initial_cash
@@ -37,14 +59,7 @@ class Portfolio:
         
         self.trades_count += 1
         
-        return {
-            'action': 'buy',
-            'quantity': quantity,
-            'price': price,
-            'total_cost': total_cost,
-            'remaining_cash': self.cash,
-            'sol_holdings': self.sol_quantity
-        }
+        return TradeResult('buy', quantity, price, total_cost, self.cash, self.sol_quantity)
     
     def sell_sol(self, quantity, price):
         """Sell SOL for cash"""
@@ -63,14 +78,7 @@ class Portfolio:
         
         self.trades_count += 1
         
-        return {
-            'action': 'sell',
-            'quantity': quantity,
-            'price': price,
-            'total_proceeds': total_proceeds,
-            'remaining_cash': self.cash,
-            'sol_holdings': self.sol_quantity
-        }
+        return TradeResult('sell', quantity, price, total_proceeds, self.cash, self.sol_quantity)
     
     def get_total_value(self, current_sol_price):
         """Calculate total portfolio value in USDC"""
@@ -97,19 +105,19 @@ class Portfolio:
         total_pnl = self.get_total_pnl(current_sol_price)
         unrealized_pnl = self.get_unrealized_pnl(current_sol_price)
         
-        return {
-            'cash': self.cash,
-            'sol_quantity': self.sol_quantity,
-            'sol_cost_basis': self.sol_cost_basis,
-            'sol_current_price': current_sol_price,
-            'sol_market_value': self.sol_quantity * current_sol_price,
-            'total_value': total_value,
-            'initial_cash': self.initial_cash,
-            'total_pnl': total_pnl,
-            'total_pnl_pct': (total_pnl / self.initial_cash) * 100,
-            'unrealized_pnl': unrealized_pnl,
-            'trades_count': self.trades_count
-        }
+        return PortfolioSummary(
+            cash=self.cash,
+            sol_quantity=self.sol_quantity,
+            sol_cost_basis=self.sol_cost_basis,
+            sol_current_price=current_sol_price,
+            sol_market_value=self.sol_quantity * current_sol_price,
+            total_value=total_value,
+            initial_cash=self.initial_cash,
+            total_pnl=total_pnl,
+            total_pnl_pct=(total_pnl / self.initial_cash) * 100,
+            unrealized_pnl=unrealized_pnl,
+            trades_count=self.trades_count
+        )
     
     def print_summary(self, current_sol_price):
         """Print formatted portfolio summary"""
@@ -118,16 +126,16 @@ class Portfolio:
         print("\n" + "="*50)
         print("PORTFOLIO SUMMARY")
         print("="*50)
-        print(f"Cash (USDC):      ${summary['cash']:>10,.2f}")
-        print(f"SOL Holdings:     {summary['sol_quantity']:>10.4f}")
-        print(f"SOL Cost Basis:   ${summary['sol_cost_basis']:>10.4f}")
-        print(f"SOL Market Price: ${summary['sol_current_price']:>10.4f}")
-        print(f"SOL Market Value: ${summary['sol_market_value']:>10.2f}")
+        print(f"Cash (USDC):      ${summary.cash:>10,.2f}")
+        print(f"SOL Holdings:     {summary.sol_quantity:>10.4f}")
+        print(f"SOL Cost Basis:   ${summary.sol_cost_basis:>10.4f}")
+        print(f"SOL Market Price: ${summary.sol_current_price:>10.4f}")
+        print(f"SOL Market Value: ${summary.sol_market_value:>10.2f}")
         print("-"*50)
-        print(f"Total Value:      ${summary['total_value']:>10.2f}")
-        print(f"Initial Cash:     ${summary['initial_cash']:>10.2f}")
-        print(f"Total P&L:        ${summary['total_pnl']:>10.2f}")
-        print(f"Total P&L %:      {summary['total_pnl_pct']:>9.2f}%")
-        print(f"Unrealized P&L:   ${summary['unrealized_pnl']:>10.2f}")
-        print(f"Total Trades:     {summary['trades_count']:>10}")
+        print(f"Total Value:      ${summary.total_value:>10.2f}")
+        print(f"Initial Cash:     ${summary.initial_cash:>10.2f}")
+        print(f"Total P&L:        ${summary.total_pnl:>10.2f}")
+        print(f"Total P&L %:      {summary.total_pnl_pct:>9.2f}%")
+        print(f"Unrealized P&L:   ${summary.unrealized_pnl:>10.2f}")
+        print(f"Total Trades:     {summary.trades_count:>10}")
         print("="*50)
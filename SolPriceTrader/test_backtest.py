@@ -0,0 +1,37 @@
+"""
+Tests that the offline backtest kernel trades exactly like the live simulator
+"""
+
+import numpy as np
+import trading_simulator
+from trading_simulator import TradingSimulator
+from utils import ACTION_NAMES, TRADE_FLOAT_FIELDS
+
+def run_live(prices, ma_period, initial_cash, slippage_rate):
+    """Feed prices through the live strategy path the way strategy_loop does"""
+    simulator = TradingSimulator(initial_cash=initial_cash, ma_period=ma_period, slippage_rate=slippage_rate)
+    for price in prices:
+        ma_value = simulator._ma.update(price)
+        if ma_value is not None:
+            signal = simulator.check_trading_signal(price, ma_value)
+            if signal:
+                simulator.execute_trade(signal, price, ma_value)
+    simulator.close_csv_file()
+    return simulator.trades
+
+def test_backtest_matches_live_trades(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The live simulator writes its trade log to the working directory
+    monkeypatch.setattr(trading_simulator, 'InteractiveVisualizer', lambda disp_skip: None)
+    
+    prices = 150 + np.cumsum(np.random.default_rng(7).normal(0, 0.5, 500))
+    ma_period, initial_cash, slippage_rate = 20, 10000, 0.001
+    
+    live = run_live(prices.tolist(), ma_period, initial_cash, slippage_rate)
+    trades, equity = TradingSimulator.backtest(prices, ma_period, initial_cash, slippage_rate)
+    
+    assert len(live) > 10
+    assert len(trades) == len(live)
+    assert [trade['action'] for trade in trades] == [ACTION_NAMES[code] for code in live.action[:len(live)]]
+    for name in TRADE_FLOAT_FIELDS:
+        np.testing.assert_allclose([trade[name] for trade in trades], getattr(live, name)[:len(live)], rtol=1e-9)
+    assert len(equity) == len(prices)
@@ -0,0 +1,29 @@
+"""
+Tests for trade log helpers in utils.py
+"""
+
+from datetime import datetime
+from utils import TRADE_FIELDS, read_trades_csv
+import utils
+
+LEGACY_ROW = '2025-07-21T03:48:20.123456,BUY,150.5,66.4,0.15,10000.0,0.0,0.0,150.2'
+CURRENT_ROW = '1792104041,SELL,151.25,66.4,0.15,10040.0,40.0,40.0,150.9'
+
+def write_mixed_log(tmp_path):
+    """Write a log that an older version started and the current version appended to"""
+    path = tmp_path / 'trades_mixed.csv'
+    path.write_text('\n'.join([','.join(TRADE_FIELDS), LEGACY_ROW, CURRENT_ROW]) + '\n')
+    return path
+
+def check_mixed_columns(columns):
+    legacy = int(datetime.fromisoformat('2025-07-21T03:48:20.123456').timestamp())
+    assert columns['timestamp'].tolist() == [legacy, 1792104041]
+    assert list(columns['action']) == ['BUY', 'SELL']
+    assert columns['pnl'].tolist() == [0.0, 40.0]
+
+def test_read_mixed_timestamp_formats(tmp_path):
+    check_mixed_columns(read_trades_csv(write_mixed_log(tmp_path)))
+
+def test_read_mixed_timestamp_formats_without_pandas(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'pd', None)
+    check_mixed_columns(read_trades_csv(write_mixed_log(tmp_path)))
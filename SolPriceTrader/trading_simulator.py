@@ -2,34 +2,69 @@
 Main trading simulator class that orchestrates the mean reversion trading strategy
 """
 
+import atexit
+import logging
+import queue
+import threading
 import time
 import csv
 import os
 from datetime import datetime
-from data_fetcher import JupiterDataFetcher
+import numpy as np
+import backtest
+from data_fetcher import JupiterPollingFetcher, JupiterStreamFetcher
 from portfolio import Portfolio
-from visualizer import TradingVisualizer
-from utils import calculate_moving_average, format_currency
+from visualizer import InteractiveVisualizer
+from utils import EMA, RingBuffer, RollingMean, TradeLog, format_currency
+
+log = logging.getLogger(__name__)
+
+# Position state (int so the per-tick signal check avoids string comparisons)
+POSITION_CASH = 0
+POSITION_SOL = 1
+POSITION_NAMES = ('CASH', 'SOL')
 
 class TradingSimulator:
     """Main trading simulator implementing mean reversion strategy"""
     
-    def __init__(self, initial_cash=10000, ma_period=20, fetch_interval=30, slippage_rate=0.001):
+    history_size = 8192  # Prices/MA values retained in memory
+    csv_flush_every = 10  # Trades buffered before flushing the CSV log
+    
+    def __init__(self, initial_cash=10000, ma_period=20, fetch_interval=30, slippage_rate=0.001, use_stream=False,
+                 disp_skip=1):
         self.initial_cash = initial_cash
         self.ma_period = ma_period
         self.fetch_interval = fetch_interval
         self.slippage_rate = slippage_rate
+        self.use_stream = use_stream
+        
+        # Fixed slippage applied as a single multiply per trade
+        self._buy_factor = 1 + slippage_rate
+        self._sell_factor = 1 - slippage_rate
         
         # Initialize components
-        self.data_fetcher = JupiterDataFetcher()
+        # Prices are fetched on a background thread so network waits overlap with
+        # strategy and logging
+        if use_stream:
+            self.data_fetcher = JupiterStreamFetcher(poll_interval=fetch_interval)
+        else:
+            self.data_fetcher = JupiterPollingFetcher(poll_interval=fetch_interval)
         self.portfolio = Portfolio(initial_cash)
-        self.visualizer = TradingVisualizer()
+        self.visualizer = InteractiveVisualizer(disp_skip=disp_skip)
+        self._viz_queue = queue.Queue(maxsize=1)  # Latest chart snapshot awaiting render
         
         # Trading state
-        self.price_history = []
-        self.ma_history = []
-        self.trades = []
-        self.position = 'cash'  # 'cash' or 'sol'
+        self.price_history = RingBuffer(self.history_size)
+        self.price_times = RingBuffer(self.history_size)  # Arrival time (Unix seconds) of each price
+        self.ma_history = RingBuffer(self.history_size)
+        self.data_points = 0  # Total prices received (history buffers cap at history_size)
+        self.trades = TradeLog()
+        self.position = POSITION_CASH
+        self._trade_handlers = {'buy': self._execute_buy, 'sell': self._execute_sell}
+        
+        # Moving averages updated in O(1) per price
+        self._ma = RollingMean(ma_period)
+        self._ema = EMA(2 / (ma_period + 1))
         
         # CSV file for logging trades
         self.csv_filename = f"trades_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -40,141 +75,234 @@ class TradingSimulator:
         print(f"  MA Period: {ma_period}")
         print(f"  Fetch Interval: {fetch_interval}s")
         print(f"  Slippage Rate: {slippage_rate*100:.2f}%")
+        print(f"  Price Source: {'stream' if use_stream else 'polling'}")
         print(f"  Trade Log: {self.csv_filename}")
         print()
     
     def init_csv_file(self):
-        """Initialize CSV file with headers"""
+        """Open the CSV file for the session and write headers"""
         headers = [
             'timestamp', 'action', 'price', 'quantity', 'slippage', 
             'total_value', 'pnl', 'cumulative_pnl', 'ma_value'
         ]
         
-        with open(self.csv_filename, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)
+        self._csv_fh = open(self.csv_filename, 'w', newline='', buffering=1 << 16)
+        self._csv_writer = csv.writer(self._csv_fh)
+        self._csv_writer.writerow(headers)
+        self._csv_pending = 0
+        
+        # Flush any buffered trades on shutdown (including Ctrl+C via sys.exit)
+        atexit.register(self.close_csv_file)
+    
+    def close_csv_file(self):
+        """Flush and close the CSV trade log"""
+        if not self._csv_fh.closed:
+            self._csv_fh.close()
     
     def log_trade(self, action, price, quantity, slippage, total_value, pnl, cumulative_pnl, ma_value):
         """Log trade details to CSV file"""
-        timestamp = datetime.now().isoformat()
+        timestamp = int(time.time())  # Unix seconds
         
         trade_data = [
             timestamp, action, price, quantity, slippage,
             total_value, pnl, cumulative_pnl, ma_value
         ]
         
-        with open(self.csv_filename, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(trade_data)
+        self._csv_writer.writerow(trade_data)
+        self._csv_pending += 1
+        if self._csv_pending >= self.csv_flush_every:
+            self._csv_fh.flush()
+            self._csv_pending = 0
         
         # Also store in memory for visualization
-        self.trades.append({
-            'timestamp': timestamp,
-            'action': action,
-            'price': price,
-            'quantity': quantity,
-            'slippage': slippage,
-            'total_value': total_value,
-            'pnl': pnl,
-            'cumulative_pnl': cumulative_pnl,
-            'ma_value': ma_value
-        })
+        self.trades.append(timestamp, action, price, quantity, slippage,
+                           total_value, pnl, cumulative_pnl, ma_value)
     
     def execute_trade(self, action, current_price, ma_value):
         """Execute a trade based on the mean reversion strategy"""
-        if action == 'buy' and self.position == 'cash':
-            # Buy SOL with available cash
-            available_cash = self.portfolio.cash
-            if available_cash > 0:
-                # Calculate slippage
-                slippage = current_price * self.slippage_rate
-                effective_price = current_price + slippage
-                
-                # Calculate quantity of SOL to buy
-                quantity = available_cash / effective_price
-                
-                # Execute the trade
-                self.portfolio.buy_sol(quantity, effective_price)
-                self.position = 'sol'
-                
-                # Calculate PnL (0 for buy trades)
-                pnl = 0
-                cumulative_pnl = self.portfolio.get_total_value(current_price) - self.initial_cash
-                
-                # Log the trade
-                self.log_trade('BUY', effective_price, quantity, slippage, 
-                             self.portfolio.get_total_value(current_price), 
-                             pnl, cumulative_pnl, ma_value)
-                
-                print(f"🟢 BUY  | SOL: {quantity:.4f} @ ${effective_price:.4f} | "
-                      f"Slippage: ${slippage:.4f} | Total: ${self.portfolio.get_total_value(current_price):.2f}")
-        
-        elif action == 'sell' and self.position == 'sol':
-            # Sell all SOL for cash
-            sol_quantity = self.portfolio.sol_quantity
-            if sol_quantity > 0:
-                # Calculate slippage
-                slippage = current_price * self.slippage_rate
-                effective_price = current_price - slippage
-                
-                # Calculate PnL
-                cost_basis = self.portfolio.sol_cost_basis
-                pnl = (effective_price - cost_basis) * sol_quantity
-                
-                # Execute the trade
-                self.portfolio.sell_sol(sol_quantity, effective_price)
-                self.position = 'cash'
-                
-                cumulative_pnl = self.portfolio.get_total_value(current_price) - self.initial_cash
-                
-                # Log the trade
-                self.log_trade('SELL', effective_price, sol_quantity, slippage,
-                             self.portfolio.get_total_value(current_price),
-                             pnl, cumulative_pnl, ma_value)
-                
-                print(f"🔴 SELL | SOL: {sol_quantity:.4f} @ ${effective_price:.4f} | "
-                      f"Slippage: ${slippage:.4f} | PnL: {format_currency(pnl)} | "
-                      f"Total: ${self.portfolio.get_total_value(current_price):.2f}")
+        handler = self._trade_handlers.get(action)
+        if handler is not None:
+            handler(current_price, ma_value)
+    
+    def _execute_buy(self, current_price, ma_value):
+        """Buy SOL with all available cash"""
+        if self.position != POSITION_CASH:
+            return
+        
+        available_cash = self.portfolio.cash
+        if available_cash > 0:
+            # Calculate slippage
+            effective_price = current_price * self._buy_factor
+            slippage = effective_price - current_price
+            
+            # Calculate quantity of SOL to buy
+            quantity = available_cash / effective_price
+            
+            # Execute the trade
+            self.portfolio.buy_sol(quantity, effective_price)
+            self.position = POSITION_SOL
+            
+            # Calculate PnL (0 for buy trades)
+            pnl = 0
+            total_value = self.portfolio.get_total_value(current_price)
+            cumulative_pnl = total_value - self.initial_cash
+            
+            # Log the trade
+            self.log_trade('BUY', effective_price, quantity, slippage, 
+                         total_value, pnl, cumulative_pnl, ma_value)
+            
+            log.info("🟢 BUY  | SOL: %.4f @ $%.4f | Slippage: $%.4f | Total: $%.2f",
+                     quantity, effective_price, slippage, total_value)
+    
+    def _execute_sell(self, current_price, ma_value):
+        """Sell all SOL for cash"""
+        if self.position != POSITION_SOL:
+            return
+        
+        sol_quantity = self.portfolio.sol_quantity
+        if sol_quantity > 0:
+            # Calculate slippage
+            effective_price = current_price * self._sell_factor
+            slippage = current_price - effective_price
+            
+            # Calculate PnL
+            cost_basis = self.portfolio.sol_cost_basis
+            pnl = (effective_price - cost_basis) * sol_quantity
+            
+            # Execute the trade
+            self.portfolio.sell_sol(sol_quantity, effective_price)
+            self.position = POSITION_CASH
+            
+            total_value = self.portfolio.get_total_value(current_price)
+            cumulative_pnl = total_value - self.initial_cash
+            
+            # Log the trade
+            self.log_trade('SELL', effective_price, sol_quantity, slippage,
+                         total_value, pnl, cumulative_pnl, ma_value)
+            
+            log.info("🔴 SELL | SOL: %.4f @ $%.4f | Slippage: $%.4f | PnL: %s | Total: $%.2f",
+                     sol_quantity, effective_price, slippage, format_currency(pnl), total_value)
     
     def check_trading_signal(self, current_price, ma_value):
         """Check if we should buy or sell based on mean reversion strategy"""
-        if current_price < ma_value and self.position == 'cash':
-            return 'buy'
-        elif current_price > ma_value and self.position == 'sol':
-            return 'sell'
-        return None
+        if self.position:  # Holding SOL
+            return 'sell' if current_price > ma_value else None
+        return 'buy' if current_price < ma_value else None
     
     def display_status(self, current_price, ma_value):
         """Display current trading status"""
+        if not log.isEnabledFor(logging.INFO):
+            return
+        
         total_value = self.portfolio.get_total_value(current_price)
         cumulative_pnl = total_value - self.initial_cash
         
-        print(f"📊 Price: ${current_price:.4f} | MA: ${ma_value:.4f} | "
-              f"Position: {self.position.upper()} | "
-              f"Total: ${total_value:.2f} | "
-              f"PnL: {format_currency(cumulative_pnl)}")
+        log.info("📊 Price: $%.4f | MA: $%.4f | EMA: $%.4f | Position: %s | Total: $%.2f | PnL: %s",
+                 current_price, ma_value, self._ema.value, POSITION_NAMES[self.position],
+                 total_value, format_currency(cumulative_pnl))
+    
+    def fetch_price(self):
+        """Wait for the next price pushed by the background fetcher"""
+        return self.data_fetcher.get_next_price(timeout=self.fetch_interval * 2)
+    
+    @staticmethod
+    def backtest(prices, ma_period=20, initial_cash=10000, slippage_rate=0.001, csv_filename=None):
+        """
+        Replay historical prices through the compiled strategy kernel (no live simulator needed)
+        Returns (trades, equity) where trades use the same dict layout as live trades
+        and 'timestamp' holds the tick index; optionally writes the ledger to CSV
+        """
+        prices = np.ascontiguousarray(prices, dtype=np.float64)
+        ledger, equity = backtest.simulate(prices, ma_period, float(initial_cash), slippage_rate)
+        
+        trades = [
+            {
+                'timestamp': int(row[backtest.TRADE_INDEX]),
+                'action': 'BUY' if row[backtest.TRADE_ACTION] == backtest.ACTION_BUY else 'SELL',
+                'price': row[backtest.TRADE_PRICE],
+                'quantity': row[backtest.TRADE_QUANTITY],
+                'slippage': row[backtest.TRADE_SLIPPAGE],
+                'total_value': row[backtest.TRADE_TOTAL_VALUE],
+                'pnl': row[backtest.TRADE_PNL],
+                'cumulative_pnl': row[backtest.TRADE_CUMULATIVE_PNL],
+                'ma_value': row[backtest.TRADE_MA_VALUE]
+            }
+            for row in ledger.tolist()
+        ]
+        
+        if csv_filename is not None:
+            with open(csv_filename, 'w', newline='') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=[
+                    'timestamp', 'action', 'price', 'quantity', 'slippage',
+                    'total_value', 'pnl', 'cumulative_pnl', 'ma_value'
+                ])
+                writer.writeheader()
+                writer.writerows(trades)
+        
+        print(f"Backtest complete: {len(prices)} prices, {len(trades)} trades, "
+              f"final value ${equity[-1] if len(equity) else initial_cash:,.2f}")
+        
+        return trades, equity
     
     def run(self):
-        """Main simulation loop"""
+        """
+        Start the simulation
+        The strategy runs on a worker thread while the main thread renders charts,
+        since matplotlib GUI backends must stay on the main thread
+        """
         print("Starting simulation...")
         print("Waiting for initial data to calculate moving average...")
         
+        self.data_fetcher.start()
+        strategy_thread = threading.Thread(target=self.strategy_loop, daemon=True)
+        strategy_thread.start()
+        
+        while strategy_thread.is_alive():
+            try:
+                snapshot = self._viz_queue.get_nowait()
+            except queue.Empty:
+                # Nothing to render; let the GUI handle its own events for a moment
+                self.visualizer.process_events(0.1)
+                continue
+            self.visualizer.update_plot(*snapshot)
+    
+    def queue_plot_update(self):
+        """Hand the latest chart snapshot to the render loop, replacing any stale one"""
+        snapshot = (
+            self.price_history.last(100).copy(),  # Last 100 prices
+            self.ma_history.last(100).copy(),     # Last 100 MA values
+            self.trades,                          # Append-only TradeLog; rows are never rewritten
+            self.price_times.last(100).copy()     # Arrival times of those prices
+        )
+        try:
+            self._viz_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._viz_queue.put_nowait(snapshot)
+        except queue.Full:
+            pass  # Renderer is behind; drop this frame
+    
+    def strategy_loop(self):
+        """Main simulation loop"""
         while True:
             try:
-                # Fetch current price
-                current_price = self.data_fetcher.get_sol_usdc_price()
+                # Wait for the next price from the fetch thread
+                current_price = self.fetch_price()
                 
                 if current_price is None:
-                    print("❌ Failed to fetch price, retrying in 30 seconds...")
-                    time.sleep(self.fetch_interval)
+                    log.warning("❌ No price received, still waiting for data...")
                     continue
                 
-                # Add to price history
+                # Add to price history, stamped with its arrival time (stream ticks are sub-second)
                 self.price_history.append(current_price)
+                self.price_times.append(time.time())
+                self.data_points += 1
+                ma_value = self._ma.update(current_price)
+                self._ema.update(current_price)
                 
-                # Calculate moving average if we have enough data
-                if len(self.price_history) >= self.ma_period:
-                    ma_value = calculate_moving_average(self.price_history, self.ma_period)
+                # Trade once we have enough data for the moving average
+                if ma_value is not None:
                     self.ma_history.append(ma_value)
                     
                     # Check for trading signals
@@ -187,22 +315,15 @@ class TradingSimulator:
                     self.display_status(current_price, ma_value)
                     
                     # Update visualization every 10 data points
-                    if len(self.price_history) % 10 == 0:
-                        self.visualizer.update_plot(
-                            self.price_history[-100:],  # Last 100 prices
-                            self.ma_history[-100:],     # Last 100 MA values
-                            self.trades[-20:] if len(self.trades) > 20 else self.trades  # Last 20 trades
-                        )
+                    if self.data_points % 10 == 0:
+                        self.queue_plot_update()
                 
                 else:
                     remaining = self.ma_period - len(self.price_history)
-                    print(f"📈 Price: ${current_price:.4f} | "
-                          f"Collecting data... ({remaining} more needed for MA)")
-                
-                # Wait for next fetch
-                time.sleep(self.fetch_interval)
+                    log.info("📈 Price: $%.4f | Collecting data... (%d more needed for MA)",
+                             current_price, remaining)
                 
             except Exception as e:
-                print(f"❌ Error in simulation loop: {e}")
-                print("Retrying in 30 seconds...")
+                log.error("❌ Error in simulation loop: %s", e)
+                log.error("Retrying in %s seconds...", self.fetch_interval)
                 time.sleep(self.fetch_interval)
@@ -2,8 +2,158 @@
 Utility functions for the trading simulator
 """
 
+import csv
 import statistics
+from collections import deque
 from datetime import datetime
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:  # pandas is optional; trade logs are then parsed with the csv module
+    pd = None
+
+# Trade log columns, in CSV order
+TRADE_FIELDS = ('timestamp', 'action', 'price', 'quantity', 'slippage',
+                'total_value', 'pnl', 'cumulative_pnl', 'ma_value')
+TRADE_FLOAT_FIELDS = TRADE_FIELDS[2:]
+
+# Trade actions as stored in TradeLog.action
+ACTION_BUY = 0
+ACTION_SELL = 1
+ACTION_NAMES = ('BUY', 'SELL')
+ACTION_CODES = {'BUY': ACTION_BUY, 'SELL': ACTION_SELL}
+
+class RingBuffer:
+    """Fixed-size float64 ring buffer that keeps the most recent values"""
+    
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.values = np.empty(capacity, dtype=np.float64)
+        self._head = 0  # Index the next value is written to
+        self._count = 0
+    
+    def __len__(self):
+        return self._count
+    
+    def append(self, value):
+        """Append a value, overwriting the oldest once full"""
+        self.values[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+    
+    def last(self, k):
+        """
+        Return the most recent k values in chronological order
+        Returns a view when the values are contiguous, otherwise a copy
+        """
+        k = min(k, self._count)
+        start = (self._head - k) % self.capacity
+        if start + k <= self.capacity:
+            return self.values[start:start + k]
+        return np.concatenate((self.values[start:], self.values[:self._head]))
+
+class TradeLog:
+    """
+    Append-only trade ledger stored column-wise: one NumPy array per field, doubled when full
+    timestamp holds Unix seconds (int64) and action holds ACTION_BUY/ACTION_SELL (uint8);
+    the other fields are float64. Rows [0, len) are valid; readers should take len() first
+    """
+    
+    def __init__(self, capacity=1024):
+        self.n = 0
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.action = np.empty(capacity, dtype=np.uint8)
+        for name in TRADE_FLOAT_FIELDS:
+            setattr(self, name, np.empty(capacity, dtype=np.float64))
+    
+    def __len__(self):
+        return self.n
+    
+    def _reserve(self, count):
+        """Grow every column so count more rows fit"""
+        capacity = len(self.timestamp)
+        if self.n + count <= capacity:
+            return
+        while capacity < self.n + count:
+            capacity *= 2
+        for name in TRADE_FIELDS:
+            column = np.empty(capacity, dtype=getattr(self, name).dtype)
+            column[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, column)
+    
+    def append(self, timestamp, action, price, quantity, slippage, total_value, pnl, cumulative_pnl, ma_value):
+        """Append one trade (action is 'BUY' or 'SELL')"""
+        self._reserve(1)
+        i = self.n
+        self.timestamp[i] = timestamp
+        self.action[i] = ACTION_CODES[action]
+        self.price[i] = price
+        self.quantity[i] = quantity
+        self.slippage[i] = slippage
+        self.total_value[i] = total_value
+        self.pnl[i] = pnl
+        self.cumulative_pnl[i] = cumulative_pnl
+        self.ma_value[i] = ma_value
+        self.n = i + 1  # Publish the row only once it is complete
+    
+    def extend(self, columns):
+        """Append many trades from columns (timestamp in Unix seconds, action as 'BUY'/'SELL' strings)"""
+        count = len(columns['timestamp'])
+        self._reserve(count)
+        start, stop = self.n, self.n + count
+        self.timestamp[start:stop] = columns['timestamp']
+        self.action[start:stop] = np.asarray(columns['action']) == 'SELL'
+        for name in TRADE_FLOAT_FIELDS:
+            getattr(self, name)[start:stop] = columns[name]
+        self.n = stop
+    
+    def to_dicts(self, start=0, stop=None):
+        """Materialize rows [start, stop) as trade dicts with ISO timestamps (for APIs)"""
+        start, stop, _ = slice(start, stop).indices(self.n)
+        if start >= stop:
+            return []
+        columns = [getattr(self, name)[start:stop].tolist() for name in TRADE_FLOAT_FIELDS]
+        timestamps = [datetime.fromtimestamp(ts).isoformat() for ts in self.timestamp[start:stop].tolist()]
+        actions = [ACTION_NAMES[code] for code in self.action[start:stop].tolist()]
+        return [dict(zip(TRADE_FIELDS, row)) for row in zip(timestamps, actions, *columns)]
+
+def read_trades_csv(filename):
+    """
+    Read a trade log CSV into columns
+    Returns a dict with 'timestamp' as int64 Unix seconds, 'action' as a list of strings and the
+    numeric fields as float64 arrays
+    """
+    if pd is not None:
+        dtypes = {name: 'float64' for name in TRADE_FLOAT_FIELDS}
+        dtypes.update(timestamp=str, action=str)
+        frame = pd.read_csv(filename, dtype=dtypes)
+        columns = {name: frame[name].to_numpy() for name in TRADE_FLOAT_FIELDS}
+        columns['timestamp'] = parse_trade_timestamps(frame['timestamp'].tolist())
+        columns['action'] = frame['action'].tolist()
+        return columns
+    
+    with open(filename, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, TRADE_FIELDS)
+        rows = list(reader)
+    
+    # Transpose once and let NumPy convert each numeric column in bulk
+    raw = dict(zip(header, zip(*rows))) if rows else dict.fromkeys(header, ())
+    columns = {name: np.array(raw[name], dtype=np.float64) for name in TRADE_FLOAT_FIELDS}
+    columns['timestamp'] = parse_trade_timestamps(raw['timestamp'])
+    columns['action'] = list(raw['action'])
+    return columns
+
+def parse_trade_timestamps(values):
+    """Convert logged timestamps to int64 Unix seconds (older logs stored ISO-8601 strings)"""
+    try:
+        return np.array(values, dtype=np.int64)
+    except ValueError:
+        # Logs appended to across versions mix both formats, so convert value by value
+        return np.array([int(value) if value.isdigit() else int(datetime.fromisoformat(value).timestamp())
+                         for value in values], dtype=np.int64)
 
 def calculate_moving_average(prices, period):
     """Calculate simple moving average for the given period"""
@@ -26,12 +176,56 @@ def calculate_exponential_moving_average(prices, period, alpha=None):
     
     return ema
 
+class EMA:
+    """Incrementally updated exponential moving average (O(1) per price)"""
+    
+    __slots__ = ('alpha', 'value')
+    
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+    
+    def update(self, price):
+        """Fold a new price into the average, seeding with the first price"""
+        if self.value is None:
+            self.value = price
+        else:
+            self.value = self.alpha * price + (1 - self.alpha) * self.value
+        return self.value
+
+class RollingMean:
+    """Simple moving average over the last `period` prices, kept with a running sum (O(1) per price)"""
+    
+    __slots__ = ('period', 'window', 'total')
+    
+    def __init__(self, period, seed=()):
+        self.reset(period, seed)
+    
+    def reset(self, period, seed=()):
+        """Start over with a new period, pre-filled with the most recent `period` prices of seed"""
+        self.period = period
+        self.window = deque(seed, maxlen=period)
+        self.total = sum(self.window)
+    
+    def update(self, price):
+        """Add a price to the window and return the mean once the window is full"""
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(price)
+        self.total += price
+        
+        if len(self.window) < self.period:
+            return None
+        return self.total / self.period
+
+# Precomputed color-coded templates for format_currency
+_POSITIVE_CURRENCY = "💚 %s%s"
+_NEGATIVE_CURRENCY = "❤️ %s%s"
+
 def format_currency(amount, currency='$'):
     """Format currency amount with appropriate color coding"""
-    if amount >= 0:
-        return f"💚 {currency}{amount:,.2f}"
-    else:
-        return f"❤️ {currency}{amount:,.2f}"
+    template = _POSITIVE_CURRENCY if amount >= 0 else _NEGATIVE_CURRENCY
+    return template % (currency, format(amount, ',.2f'))
 
 def calculate_slippage(price, slippage_rate):
     """Calculate slippage amount"""
@@ -68,30 +262,22 @@ def calculate_sharpe_ratio(returns, risk_free_rate=0.02):
     if len(returns) < 2:
         return 0
     
-    excess_returns = [r - risk_free_rate/252 for r in returns]  # Daily risk-free rate
+    excess_returns = np.asarray(returns, dtype=np.float64) - risk_free_rate/252  # Daily risk-free rate
+    std = excess_returns.std(ddof=1)
     
-    if statistics.stdev(excess_returns) == 0:
+    if std == 0:
         return 0
     
-    return statistics.mean(excess_returns) / statistics.stdev(excess_returns)
+    return float(excess_returns.mean() / std)
 
 def calculate_max_drawdown(pnl_values):
     """Calculate maximum drawdown from PnL values"""
     if len(pnl_values) < 2:
         return 0
     
-    peak = pnl_values[0]
-    max_drawdown = 0
-    
-    for pnl in pnl_values[1:]:
-        if pnl > peak:
-            peak = pnl
-        
-        drawdown = peak - pnl
-        if drawdown > max_drawdown:
-            max_drawdown = drawdown
-    
-    return max_drawdown
+    values = np.asarray(pnl_values, dtype=np.float64)
+    peaks = np.maximum.accumulate(values)
+    return float((peaks - values).max())
 
 def calculate_win_rate(trades):
     """Calculate win rate from trade history"""
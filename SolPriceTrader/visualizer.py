@@ -4,23 +4,82 @@ Real-time visualization of trading data using matplotlib
 
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+import io
+from abc import ABC, abstractmethod
+import multiprocessing
+import time
 from datetime import datetime
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import numpy as np
+from utils import ACTION_BUY, read_trades_csv
 
-class TradingVisualizer:
-    """Creates and updates real-time trading charts"""
+try:
+    import imageio.v3 as iio
+except ImportError:  # imageio is optional; only needed by export_movie
+    iio = None
+
+def unix_to_datenum(seconds):
+    """Convert Unix seconds (int or float) to matplotlib date numbers in local time"""
+    local = np.asarray(seconds, dtype=np.float64) + time.localtime().tm_gmtoff
+    return local / 86400 + mdates.date2num(np.datetime64('1970-01-01T00:00:00'))
+
+class BlitManager:
+    """Redraws only animated artists over a cached background (matplotlib blitting pattern)"""
+    
+    def __init__(self, canvas, animated_artists=()):
+        self.canvas = canvas
+        self._bg = None
+        self.artists = []
+        
+        for artist in animated_artists:
+            self.add_artist(artist)
+        
+        # Re-capture the background whenever the full figure is redrawn (resize, rescale)
+        self.cid = canvas.mpl_connect('draw_event', self.on_draw)
+    
+    def on_draw(self, event):
+        """Cache the static background and draw the animated artists on top"""
+        self._bg = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+    
+    def add_artist(self, artist):
+        """Register an artist to be redrawn on every update"""
+        artist.set_animated(True)
+        self.artists.append(artist)
+    
+    def _draw_animated(self):
+        fig = self.canvas.figure
+        for artist in self.artists:
+            fig.draw_artist(artist)
+    
+    def update(self):
+        """Blit the animated artists onto the cached background"""
+        if self._bg is None:
+            self.canvas.draw_idle()  # on_draw captures the background once the render runs
+        else:
+            self.canvas.restore_region(self._bg)
+            self._draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+class TradingVisualizer(ABC):
+    """
+    Creates and updates real-time trading charts
+    Subclasses choose where the figure lives and how updated frames are shown
+    """
     
-    def __init__(self):
+    def __init__(self, disp_skip=1):
         # Set up the figure and subplots
-        plt.ion()  # Turn on interactive mode
-        self.fig, (self.ax1, self.ax2) = plt.subplots(2, 1, figsize=(12, 10))
+        self.fig = self._create_figure(figsize=(12, 10))
+        self.ax1, self.ax2 = self.fig.subplots(2, 1)
         self.fig.suptitle('SOL/USDC Mean Reversion Trading Simulator', fontsize=16, fontweight='bold')
         
         # Initialize empty lines
         self.price_line, = self.ax1.plot([], [], 'b-', linewidth=2, label='SOL/USDC Price')
         self.ma_line, = self.ax1.plot([], [], 'r-', linewidth=2, label='20-Period MA')
-        self.buy_markers, = self.ax1.plot([], [], '^', markersize=10, color='green', label='Buy')
-        self.sell_markers, = self.ax1.plot([], [], 'v', markersize=10, color='red', label='Sell')
+        self.buy_scatter = self.ax1.scatter([], [], marker='^', s=100, c='green', label='Buy')
+        self.sell_scatter = self.ax1.scatter([], [], marker='v', s=100, c='red', label='Sell')
         
         # Configure first subplot (Price and MA)
         self.ax1.set_title('SOL/USDC Price and Moving Average')
@@ -37,6 +96,31 @@ class TradingVisualizer:
         self.ax2.legend()
         self.ax2.axhline(y=0, color='k', linestyle='--', alpha=0.5)
         
+        # Time axis formatting is set once; the locator picks a tick spacing to fit the limits
+        for ax in (self.ax1, self.ax2):
+            locator = mdates.AutoDateLocator()
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        
+        # Persistent stats box, updated in place instead of re-created each frame
+        self.stats_text = self.ax1.text(0.02, 0.98, '', transform=self.ax1.transAxes, visible=False,
+                                        verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+        
+        self.x_margin = 0.25  # Fraction of the x-span reserved ahead of the data before a full redraw
+        self.y_margin = 0.05  # Fraction of the y-span padded above and below the data
+        self.max_trades = 20  # Most recent trades shown as markers / on the PnL line
+        
+        # Frame skipping: only every _disp_skip-th update is rendered; the skip doubles while renders
+        # are slow and halves back toward min_disp_skip once they are fast again
+        self.min_disp_skip = max(1, disp_skip)
+        self.max_disp_skip = 32
+        self.slow_frame = 0.05  # Seconds
+        self.fast_frame = 0.01
+        self.max_frame_age = 1.0  # Never skip once the last render is this old (live ticks are sparse)
+        self._disp_skip = self.min_disp_skip
+        self._frame_counter = 0
+        self._last_render = 0.0
+        
         # Data storage for plotting
         self.timestamps = []
         self.prices = []
@@ -47,122 +131,330 @@ class TradingVisualizer:
         self.sell_times = []
         self.sell_prices = []
         
-        plt.tight_layout()
-        plt.show(block=False)
+        self.fig.tight_layout()
         
         print("📊 Trading visualizer initialized")
     
-    def update_plot(self, price_history, ma_history, trades):
-        """Update the trading chart with new data"""
+    @abstractmethod
+    def _create_figure(self, figsize):
+        """Create the figure the chart is drawn on"""
+    
+    @abstractmethod
+    def _render(self, rescaled):
+        """Show the updated artists; rescaled is True when the axis limits changed"""
+    
+    def update_plot(self, price_history, ma_history, trades, price_times):
+        """
+        Update the trading chart with new data
+        trades is a TradeLog; only the most recent max_trades are shown. price_times holds the
+        arrival time (Unix seconds) of each price
+        """
+        started = time.perf_counter()
+        self._frame_counter += 1
+        if self._frame_counter % self._disp_skip and started - self._last_render < self.max_frame_age:
+            return
+        self._last_render = started
+        
         try:
-            # Update price and MA data
-            current_time = datetime.now()
-            
             # Limit data to last 100 points for performance
             max_points = 100
             
             if len(price_history) > max_points:
                 price_history = price_history[-max_points:]
                 ma_history = ma_history[-max_points:]
+                price_times = price_times[-max_points:]
             
-            # Generate timestamps for price data
-            time_interval = 30  # seconds
-            timestamps = [
-                datetime.fromtimestamp(current_time.timestamp() - (len(price_history) - i - 1) * time_interval)
-                for i in range(len(price_history))
-            ]
+            # Place prices on the same local-time axis as the trade timestamps
+            n = len(price_history)
+            price_dates = unix_to_datenum(price_times)
             
             # Update price and MA lines
-            self.price_line.set_data(timestamps, price_history)
+            self.price_line.set_data(price_dates, price_history)
             if len(ma_history) > 0:
-                ma_timestamps = timestamps[-len(ma_history):]
-                self.ma_line.set_data(ma_timestamps, ma_history)
-            
-            # Update trade markers
-            buy_times = []
-            buy_prices = []
-            sell_times = []
-            sell_prices = []
-            pnl_values = []
-            
-            for trade in trades:
-                trade_time = datetime.fromisoformat(trade['timestamp'])
-                if trade['action'] == 'BUY':
-                    buy_times.append(trade_time)
-                    buy_prices.append(trade['price'])
-                elif trade['action'] == 'SELL':
-                    sell_times.append(trade_time)
-                    sell_prices.append(trade['price'])
-                
-                pnl_values.append(trade['cumulative_pnl'])
+                ma_dates = price_dates[-len(ma_history):]
+                self.ma_line.set_data(ma_dates, ma_history)
             
-            # Update markers
-            self.buy_markers.set_data(buy_times, buy_prices)
-            self.sell_markers.set_data(sell_times, sell_prices)
+            # Slice the most recent trades straight out of the trade log columns, keeping only those
+            # inside the price window (older ones, e.g. from a loaded log, would stretch the time axis)
+            n_trades = len(trades)
+            first_visible = max(0, n_trades - self.max_trades)
+            trade_times = unix_to_datenum(trades.timestamp[first_visible:n_trades])
+            in_window = trade_times >= (price_dates[0] if n else np.inf)
+            trade_times = trade_times[in_window]
+            trade_prices = trades.price[first_visible:n_trades][in_window]
+            is_buy = trades.action[first_visible:n_trades][in_window] == ACTION_BUY
+            buy_xy = np.column_stack((trade_times[is_buy], trade_prices[is_buy]))
+            sell_xy = np.column_stack((trade_times[~is_buy], trade_prices[~is_buy]))
+            self.buy_scatter.set_offsets(buy_xy)
+            self.sell_scatter.set_offsets(sell_xy)
             
             # Update PnL line
-            if len(trades) > 0:
-                trade_times = [datetime.fromisoformat(trade['timestamp']) for trade in trades]
-                self.pnl_line.set_data(trade_times, pnl_values)
+            pnl_times = trade_times
+            pnl_values = trades.cumulative_pnl[first_visible:n_trades][in_window]
+            self.pnl_line.set_data(pnl_times, pnl_values)
             
-            # Auto-scale axes
-            self.ax1.relim()
-            self.ax1.autoscale_view()
-            
-            # Format x-axis for time
-            self.ax1.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-            self.ax1.xaxis.set_major_locator(mdates.MinuteLocator(interval=5))
-            plt.setp(self.ax1.xaxis.get_majorticklabels(), rotation=45)
-            
-            # Update PnL subplot
+            # Color PnL line based on profit/loss
             if len(pnl_values) > 0:
-                self.ax2.relim()
-                self.ax2.autoscale_view()
-                self.ax2.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-                self.ax2.xaxis.set_major_locator(mdates.MinuteLocator(interval=5))
-                plt.setp(self.ax2.xaxis.get_majorticklabels(), rotation=45)
-                
-                # Color PnL line based on profit/loss
                 if pnl_values[-1] >= 0:
                     self.pnl_line.set_color('green')
                 else:
                     self.pnl_line.set_color('red')
             
-            # Add current stats as text
-            if len(price_history) > 0 and len(trades) > 0:
+            # Update current stats text
+            if len(price_history) > 0 and n_trades > 0:
                 current_price = price_history[-1]
-                current_pnl = pnl_values[-1] if pnl_values else 0
+                current_pnl = trades.cumulative_pnl[n_trades - 1]
                 
                 stats_text = f'Current Price: ${current_price:.4f}\n'
                 stats_text += f'Current P&L: ${current_pnl:.2f}\n'
-                stats_text += f'Total Trades: {len(trades)}'
-                
-                # Remove previous text if exists
-                for txt in self.ax1.texts:
-                    txt.remove()
+                stats_text += f'Total Trades: {n_trades}'
                 
-                self.ax1.text(0.02, 0.98, stats_text, transform=self.ax1.transAxes,
-                            verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+                self.stats_text.set_text(stats_text)
+                self.stats_text.set_visible(True)
             
-            plt.tight_layout()
-            plt.draw()
-            plt.pause(0.01)  # Small pause to allow plot to update
+            # Widen the view only when data has moved outside it
+            view_times = np.concatenate((price_dates, buy_xy[:, 0], sell_xy[:, 0]))
+            view_values = np.concatenate((price_history, ma_history, buy_xy[:, 1], sell_xy[:, 1]))
+            rescaled = self._extend_limits(self.ax1, view_times, view_values)
+            if len(pnl_values) > 0:
+                rescaled |= self._extend_limits(self.ax2, pnl_times, np.append(pnl_values, 0))
+            
+            self._render(rescaled)
+            
+            self._tune_frame_skip(time.perf_counter() - started)
             
         except Exception as e:
             print(f"❌ Error updating visualization: {e}")
     
-    def save_chart(self, filename=None):
-        """Save the current chart to a file"""
+    def _tune_frame_skip(self, elapsed):
+        """Adapt how many updates are skipped to the time the last render took"""
+        if elapsed > self.slow_frame:
+            self._disp_skip = min(self._disp_skip * 2, self.max_disp_skip)
+        elif elapsed < self.fast_frame:
+            self._disp_skip = max(self._disp_skip // 2, self.min_disp_skip)
+    
+    def _extend_limits(self, ax, times, values):
+        """
+        Widen the axis limits if the data no longer fits, leaving headroom for the next updates
+        times are matplotlib date numbers; returns True when the limits changed (the cached
+        blit background is then stale)
+        """
+        if len(times) == 0 or len(values) == 0:
+            return False
+        
+        x_min, x_max = float(np.min(times)), float(np.max(times))
+        y_min, y_max = float(np.min(values)), float(np.max(values))
+        
+        (view_x0, view_x1), (view_y0, view_y1) = ax.get_xlim(), ax.get_ylim()
+        if view_x0 <= x_min and x_max <= view_x1 and view_y0 <= y_min and y_max <= view_y1:
+            return False
+        
+        x_span = max(x_max - x_min, 1 / 1440)  # At least one minute (date units are days)
+        y_span = max(y_max - y_min, abs(y_max) * 0.001, 1e-6)
+        ax.set_xlim(x_min, x_max + x_span * self.x_margin)
+        ax.set_ylim(y_min - y_span * self.y_margin, y_max + y_span * self.y_margin)
+        return True
+    
+    def save_chart(self, filename=None, dpi=150):
+        """
+        Save the current chart to a file
+        The layout is already tightened, so the figure is saved as-is instead of with bbox_inches='tight'
+        """
         if filename is None:
             filename = f"trading_chart_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
         
         try:
-            self.fig.savefig(filename, dpi=300, bbox_inches='tight')
+            self.fig.savefig(filename, dpi=dpi)
             print(f"📊 Chart saved as {filename}")
         except Exception as e:
             print(f"❌ Error saving chart: {e}")
     
+    @staticmethod
+    def export_movie(trades_csv, out_path='trading_movie.gif', fps=5, processes=None):
+        """
+        Export an animation of a trade log, one frame per trade (no visualizer instance needed)
+        Frames are rendered in parallel worker processes (matplotlib is not thread-safe), each on
+        its own Agg figure, then assembled in order with imageio
+        """
+        if iio is None:
+            print("❌ export_movie requires imageio (pip install imageio)")
+            return None
+        
+        movie = _load_movie_data(trades_csv)
+        n_frames = len(movie['times'])
+        if n_frames == 0:
+            print(f"❌ No trades to export in {trades_csv}")
+            return None
+        
+        # Workers start fresh interpreters so no GUI state is inherited from this process
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes, initializer=_init_movie_worker, initargs=(movie,)) as pool:
+            frames = pool.map(_render_frame, [{'end': i + 1} for i in range(n_frames)],
+                              chunksize=max(1, n_frames // (4 * (processes or multiprocessing.cpu_count()))))
+        
+        iio.imwrite(out_path, [iio.imread(frame) for frame in frames], duration=1000 / fps, loop=0)
+        print(f"🎞️ Movie with {n_frames} frames saved as {out_path}")
+        return out_path
+    
     def close(self):
         """Close the visualization"""
         plt.close(self.fig)
         print("📊 Trading visualizer closed")
+
+class InteractiveVisualizer(TradingVisualizer):
+    """Live chart in a GUI window, updated by blitting"""
+    
+    def __init__(self, disp_skip=1):
+        plt.ion()  # Turn on interactive mode
+        super().__init__(disp_skip)
+        
+        # Only the dynamic artists are redrawn on each update; axes, grid and legend stay cached
+        self.blit_manager = BlitManager(self.fig.canvas, [
+            self.price_line, self.ma_line, self.buy_scatter, self.sell_scatter,
+            self.pnl_line, self.stats_text
+        ])
+        
+        self.fig.canvas.mpl_connect('resize_event', self._on_resize)
+        plt.show(block=False)
+    
+    def _create_figure(self, figsize):
+        return plt.figure(figsize=figsize)
+    
+    def _render(self, rescaled):
+        """Full redraw only when the view changed, otherwise blit"""
+        if rescaled:
+            self._slow_redraw()
+        else:
+            self.blit_manager.update()
+    
+    def _slow_redraw(self):
+        """Request a full redraw (re-captures the blit background); repeated requests coalesce"""
+        self.fig.canvas.draw_idle()
+        self.fig.canvas.flush_events()
+    
+    def process_events(self, timeout):
+        """Keep the GUI responsive while waiting for the next update"""
+        self.fig.canvas.start_event_loop(timeout)
+    
+    def _on_resize(self, event):
+        """Re-layout only when the window size changes"""
+        self.fig.tight_layout()
+    
+    def save_chart(self, filename=None, dpi=150):
+        """Save the current chart to a file, including the blitted artists"""
+        # Animated (blitted) artists are skipped by normal draws; include them in the export
+        animated = self.blit_manager.artists
+        for artist in animated:
+            artist.set_animated(False)
+        try:
+            super().save_chart(filename, dpi)
+        finally:
+            for artist in animated:
+                artist.set_animated(True)
+            # Redraw at screen resolution so the blit background is re-captured without the artists
+            self.fig.canvas.draw()
+
+class HeadlessVisualizer(TradingVisualizer):
+    """
+    Off-screen chart rendered with Agg to PNG bytes (no GUI backend or display needed)
+    The PNG is rendered on demand and cached until the next update
+    """
+    
+    def __init__(self, disp_skip=1, dpi=100):
+        super().__init__(disp_skip)
+        self.max_disp_skip = self.min_disp_skip  # Every update is wanted; rendering happens on demand
+        self.dpi = dpi
+        self._png = None
+    
+    def _create_figure(self, figsize):
+        # A bare Figure on an Agg canvas: independent of pyplot's backend and figure manager
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        return fig
+    
+    def _render(self, rescaled):
+        self._png = None
+    
+    def get_png(self):
+        """Return the current chart as PNG bytes"""
+        if self._png is None:
+            buffer = io.BytesIO()
+            self.fig.savefig(buffer, format='png', dpi=self.dpi)
+            self._png = buffer.getvalue()
+        return self._png
+    
+    def process_events(self, timeout):
+        """Nothing to service without a GUI; just wait"""
+        time.sleep(timeout)
+    
+    def close(self):
+        """Release the figure"""
+        self.fig.clear()
+        print("📊 Trading visualizer closed")
+
+# Movie export workers (module level so they can be pickled into worker processes)
+
+_movie_data = None
+
+def _load_movie_data(trades_csv):
+    """Read a trade log into arrays plus axis limits shared by every frame"""
+    columns = read_trades_csv(trades_csv)
+    movie = {
+        'times': unix_to_datenum(columns['timestamp']),
+        'prices': columns['price'],
+        'ma_values': columns['ma_value'],
+        'pnl_values': columns['cumulative_pnl'],
+        'is_buy': np.asarray(columns['action']) == 'BUY'
+    }
+    if len(movie['times']):
+        price_range = np.concatenate((movie['prices'], movie['ma_values']))
+        movie['xlim'] = (movie['times'].min(), movie['times'].max() + 1 / 1440)
+        movie['price_ylim'] = (price_range.min() * 0.995, price_range.max() * 1.005)
+        movie['pnl_ylim'] = (min(0, movie['pnl_values'].min()) - 1, max(0, movie['pnl_values'].max()) + 1)
+    return movie
+
+def _init_movie_worker(movie):
+    """Receive the trade log once per worker instead of once per frame"""
+    global _movie_data
+    _movie_data = movie
+
+def _render_frame(state):
+    """Render the trade log up to state['end'] on a fresh Agg figure and return PNG bytes"""
+    movie = _movie_data
+    end = state['end']
+    times = movie['times'][:end]
+    is_buy = movie['is_buy'][:end]
+    
+    fig = Figure(figsize=state.get('figsize', (12, 10)))
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.subplots(2, 1)
+    fig.suptitle('SOL/USDC Mean Reversion Trading Simulator', fontsize=16, fontweight='bold')
+    
+    ax1.plot(times, movie['prices'][:end], 'b-', linewidth=2, label='Trade Price')
+    ax1.plot(times, movie['ma_values'][:end], 'r-', linewidth=2, label='Moving Average')
+    ax1.scatter(times[is_buy], movie['prices'][:end][is_buy], marker='^', s=100, c='green', label='Buy')
+    ax1.scatter(times[~is_buy], movie['prices'][:end][~is_buy], marker='v', s=100, c='red', label='Sell')
+    ax1.set_title('SOL/USDC Price and Moving Average')
+    ax1.set_ylabel('Price (USDC)')
+    ax1.set_ylim(movie['price_ylim'])
+    
+    pnl_values = movie['pnl_values'][:end]
+    ax2.plot(times, pnl_values, color='green' if pnl_values[-1] >= 0 else 'red', linewidth=2, label='Cumulative P&L')
+    ax2.axhline(y=0, color='k', linestyle='--', alpha=0.5)
+    ax2.set_title('Cumulative P&L')
+    ax2.set_xlabel('Time')
+    ax2.set_ylabel('P&L (USDC)')
+    ax2.set_ylim(movie['pnl_ylim'])
+    
+    for ax in (ax1, ax2):
+        ax.set_xlim(movie['xlim'])
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='upper right')
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    fig.tight_layout()
+    
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=state.get('dpi', 80))
+    return buffer.getvalue()
@@ -2,86 +2,167 @@
 Web dashboard for the SOL/USDC Mean Reversion Trading Simulator
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
+import atexit
 import json
 import csv
 import os
+from collections import deque
 from datetime import datetime
 import threading
 import time
+import uuid
+import numpy as np
 from data_fetcher import JupiterDataFetcher
 from portfolio import Portfolio
-from utils import calculate_moving_average
+from utils import RollingMean, TradeLog, read_trades_csv
+from visualizer import HeadlessVisualizer
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+try:
+    from waitress import serve
+except ImportError:  # waitress is optional; fall back to Flask's threaded server
+    serve = None
 
 app = Flask(__name__)
 
+HISTORY_POINTS = 100  # Price/MA points kept in memory for the charts
+DASHBOARD_POINTS = 50  # Price/MA points sent to the browser
+DASHBOARD_TRADES = 20  # Trades sent to the browser
+MAX_TRADES_PAGE = 500  # Upper bound on trades returned by one /api/trades request
+BOOT_ID = uuid.uuid4().hex[:12]  # Per-process ETag prefix; revisions restart at 0 on every start
+
+def dumps_json(payload):
+    """Serialize a payload to JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def revision_etag(revision):
+    """ETag for a state revision, unique to this process so a restart can't reuse an old one"""
+    return f"{BOOT_ID}-{revision}"
+
+def json_response(body):
+    """Wrap already-serialized JSON bytes in a response"""
+    return Response(body, mimetype='application/json')
+
 class WebTradingDashboard:
     def __init__(self):
         self.data_fetcher = JupiterDataFetcher()
         self.portfolio = Portfolio(10000)
-        self.price_history = []
-        self.ma_history = []
-        self.trades = []
+        self.price_history = deque(maxlen=HISTORY_POINTS)  # Oldest points drop off automatically
+        self.price_times = deque(maxlen=HISTORY_POINTS)  # Arrival time (Unix seconds) of each price
+        self.ma_history = deque(maxlen=HISTORY_POINTS)
+        self.trades = TradeLog()
+        
+        # Tails served by /api/data, maintained as data arrives so requests never slice
+        self.recent_prices = deque(maxlen=DASHBOARD_POINTS)
+        self.recent_ma = deque(maxlen=DASHBOARD_POINTS)
+        
         self.current_price = 0
         self.current_ma = 0
         self.position = 'cash'
+        self._trade_handlers = {'buy': self._execute_buy, 'sell': self._execute_sell}
         self.ma_period = 20
         self.is_running = False
         self.auto_trading = False
         self.slippage_rate = 0.001
         self.fetch_interval = 30
         
-        # Find the most recent CSV file
+        # Guards prices, trades, position and portfolio across the fetch thread and request handlers
+        self.lock = threading.RLock()
+        
+        # Immutable (revision, JSON bytes) snapshot of /api/data, rebuilt on the next request after
+        # any state change; revision increases with every change so clients can skip unchanged payloads
+        self.revision = 0
+        self._snapshot = None
+        
+        # Off-screen chart served by /api/chart.png, re-rendered at most once per revision
+        self.chart = HeadlessVisualizer()
+        self._chart_png = None  # (revision, PNG bytes)
+        self._chart_lock = threading.Lock()
+        
+        # Set to wake the fetch thread early when fetch_interval changes
+        self._reschedule = threading.Event()
+        
+        # Moving average updated in O(1) per price; reset when ma_period changes
+        self._ma = RollingMean(self.ma_period)
+        
+        # Find the most recent CSV file; it is opened for appending on the first trade
         self.csv_filename = self.find_latest_csv()
+        self._csv_fh = None
+        atexit.register(self.close_csv_file)
         
         # Start background data fetching
         self.start_data_fetching()
         
     def find_latest_csv(self):
         """Find the most recent trades CSV file"""
-        csv_files = [f for f in os.listdir('.') if f.startswith('trades_') and f.endswith('.csv')]
-        if csv_files:
-            return max(csv_files, key=os.path.getctime)
+        # One directory scan; DirEntry.stat() reuses what scandir already gathered where it can
+        with os.scandir('.') as entries:
+            candidates = [(entry.stat().st_ctime, entry.name) for entry in entries
+                          if entry.name.startswith('trades_') and entry.name.endswith('.csv')]
+        if candidates:
+            return max(candidates)[1]
         return None
     
     def start_data_fetching(self):
         """Start background data fetching thread"""
         def fetch_data():
+            scheduled = time.monotonic()
             while True:
+                retry_delay = None
                 try:
                     # Get latest price
                     price = self.data_fetcher.get_sol_usdc_price()
                     if price:
-                        self.current_price = price
-                        self.price_history.append(price)
-                        
-                        # Keep only last 100 points for performance
-                        if len(self.price_history) > 100:
-                            self.price_history = self.price_history[-100:]
-                        
-                        # Calculate moving average
-                        if len(self.price_history) >= self.ma_period:
-                            ma_value = calculate_moving_average(self.price_history, self.ma_period)
+                        with self.lock:
+                            self.current_price = price
+                            self.price_history.append(price)
+                            self.price_times.append(time.time())
+                            self.recent_prices.append(price)
+                            
+                            # Calculate moving average
+                            ma_value = self._ma.update(price)
                             if ma_value:
                                 self.current_ma = ma_value
                                 self.ma_history.append(ma_value)
-                                
-                                if len(self.ma_history) > 100:
-                                    self.ma_history = self.ma_history[-100:]
+                                self.recent_ma.append(ma_value)
                                 
                                 # Auto trading logic
                                 if self.auto_trading:
                                     self.check_and_execute_trades()
-                    
-                    time.sleep(self.fetch_interval)
+                            
+                            self.invalidate_payload()
                 except Exception as e:
                     print(f"Error in data fetching: {e}")
-                    time.sleep(30)
+                    retry_delay = 30
+                
+                scheduled = self.wait_for_next_fetch(scheduled, retry_delay)
         
         # Start thread
         thread = threading.Thread(target=fetch_data, daemon=True)
         thread.start()
     
+    def wait_for_next_fetch(self, scheduled, retry_delay=None):
+        """
+        Wait until one interval after the previous scheduled fetch and return the new slot
+        Slots advance from the schedule rather than from when a fetch finished, so fetches don't drift;
+        a settings change wakes the wait so a new fetch_interval applies immediately
+        """
+        while True:
+            next_fetch = scheduled + (retry_delay or self.fetch_interval)
+            delay = next_fetch - time.monotonic()
+            if delay <= 0:
+                return time.monotonic()  # Fell behind; start now instead of bursting to catch up
+            if not self._reschedule.wait(delay):
+                return next_fetch
+            self._reschedule.clear()
+    
     def check_and_execute_trades(self):
         """Check trading signals and execute trades if auto trading is enabled"""
         if not self.current_price or not self.current_ma:
@@ -95,81 +176,93 @@ class WebTradingDashboard:
     
     def execute_trade(self, action):
         """Execute a trade (buy or sell)"""
-        try:
-            if action == 'buy' and self.position == 'cash':
-                # Buy SOL with available cash
-                available_cash = self.portfolio.cash
-                if available_cash > 0:
-                    # Calculate slippage
-                    slippage = self.current_price * self.slippage_rate
-                    effective_price = self.current_price + slippage
-                    
-                    # Calculate quantity
-                    quantity = available_cash / effective_price
-                    
-                    # Execute trade
-                    self.portfolio.buy_sol(quantity, effective_price)
-                    self.position = 'sol'
-                    
-                    # Log trade
-                    self.log_trade('BUY', effective_price, quantity, slippage, 0)
-                    
-            elif action == 'sell' and self.position == 'sol':
-                # Sell all SOL
-                sol_quantity = self.portfolio.sol_quantity
-                if sol_quantity > 0:
-                    # Calculate slippage
-                    slippage = self.current_price * self.slippage_rate
-                    effective_price = self.current_price - slippage
-                    
-                    # Calculate PnL
-                    cost_basis = self.portfolio.sol_cost_basis
-                    pnl = (effective_price - cost_basis) * sol_quantity
-                    
-                    # Execute trade
-                    self.portfolio.sell_sol(sol_quantity, effective_price)
-                    self.position = 'cash'
-                    
-                    # Log trade
-                    self.log_trade('SELL', effective_price, sol_quantity, slippage, pnl)
-                    
-        except Exception as e:
-            print(f"Error executing trade: {e}")
+        handler = self._trade_handlers.get(action)
+        if handler is None:
+            return
+        with self.lock:
+            try:
+                handler()
+            except Exception as e:
+                print(f"Error executing trade: {e}")
+    
+    def _execute_buy(self):
+        """Buy SOL with all available cash"""
+        if self.position != 'cash':
+            return
+        
+        available_cash = self.portfolio.cash
+        if available_cash > 0:
+            # Calculate slippage
+            slippage = self.current_price * self.slippage_rate
+            effective_price = self.current_price + slippage
+            
+            # Calculate quantity
+            quantity = available_cash / effective_price
+            
+            # Execute trade
+            self.portfolio.buy_sol(quantity, effective_price)
+            self.position = 'sol'
+            
+            # Log trade
+            self.log_trade('BUY', effective_price, quantity, slippage, 0)
+    
+    def _execute_sell(self):
+        """Sell all SOL for cash"""
+        if self.position != 'sol':
+            return
+        
+        sol_quantity = self.portfolio.sol_quantity
+        if sol_quantity > 0:
+            # Calculate slippage
+            slippage = self.current_price * self.slippage_rate
+            effective_price = self.current_price - slippage
+            
+            # Calculate PnL
+            cost_basis = self.portfolio.sol_cost_basis
+            pnl = (effective_price - cost_basis) * sol_quantity
+            
+            # Execute trade
+            self.portfolio.sell_sol(sol_quantity, effective_price)
+            self.position = 'cash'
+            
+            # Log trade
+            self.log_trade('SELL', effective_price, sol_quantity, slippage, pnl)
     
     def log_trade(self, action, price, quantity, slippage, pnl):
         """Log trade to CSV and memory"""
-        timestamp = datetime.now().isoformat()
+        timestamp = int(time.time())  # Unix seconds
         total_value = self.portfolio.get_total_value(self.current_price)
         cumulative_pnl = total_value - 10000
         
-        trade = {
-            'timestamp': timestamp,
-            'action': action,
-            'price': price,
-            'quantity': quantity,
-            'slippage': slippage,
-            'total_value': total_value,
-            'pnl': pnl,
-            'cumulative_pnl': cumulative_pnl,
-            'ma_value': self.current_ma
-        }
-        
-        self.trades.append(trade)
+        self.trades.append(timestamp, action, price, quantity, slippage,
+                           total_value, pnl, cumulative_pnl, self.current_ma)
+        self.invalidate_payload()
         
-        # Write to CSV
+        # Append trade
+        if self._csv_fh is None:
+            self.open_csv_file()
+        self._csv_writer.writerow([timestamp, action, price, quantity, slippage,
+                                   total_value, pnl, cumulative_pnl, self.current_ma])
+    
+    def open_csv_file(self):
+        """Open the trade log for appending, creating it with headers if needed"""
         if not self.csv_filename:
             self.csv_filename = f"trades_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            # Create CSV with headers
-            with open(self.csv_filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['timestamp', 'action', 'price', 'quantity', 'slippage', 
-                               'total_value', 'pnl', 'cumulative_pnl', 'ma_value'])
         
-        # Append trade
-        with open(self.csv_filename, 'a', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow([timestamp, action, price, quantity, slippage,
-                           total_value, pnl, cumulative_pnl, self.current_ma])
+        is_new = not os.path.exists(self.csv_filename) or os.path.getsize(self.csv_filename) == 0
+        
+        # Line-buffered so each trade reaches the file without reopening it
+        self._csv_fh = open(self.csv_filename, 'a', newline='', buffering=1)
+        self._csv_writer = csv.writer(self._csv_fh)
+        if is_new:
+            self._csv_writer.writerow(['timestamp', 'action', 'price', 'quantity', 'slippage', 
+                                       'total_value', 'pnl', 'cumulative_pnl', 'ma_value'])
+    
+    def close_csv_file(self):
+        """Close the trade log if it is open"""
+        if self._csv_fh is not None:
+            self._csv_fh.close()
+            self._csv_fh = None
 
     def load_existing_data(self):
         """Load existing trade data from CSV"""
@@ -177,24 +270,48 @@ class WebTradingDashboard:
             return
             
         try:
-            with open(self.csv_filename, 'r', newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    trade = {
-                        'timestamp': row['timestamp'],
-                        'action': row['action'],
-                        'price': float(row['price']),
-                        'quantity': float(row['quantity']),
-                        'slippage': float(row['slippage']),
-                        'total_value': float(row['total_value']),
-                        'pnl': float(row['pnl']),
-                        'cumulative_pnl': float(row['cumulative_pnl']),
-                        'ma_value': float(row['ma_value'])
-                    }
-                    self.trades.append(trade)
+            self.trades.extend(read_trades_csv(self.csv_filename))
         except Exception as e:
             print(f"Error loading existing data: {e}")
     
+    def invalidate_payload(self):
+        """Drop the cached /api/data snapshot after the dashboard state changes (call with the lock held)"""
+        self.revision += 1
+        self._snapshot = None
+    
+    def get_dashboard_payload(self):
+        """
+        Return (revision, JSON bytes) for the dashboard data, encoding it at most once per state change
+        The snapshot is built under the lock once, then served to every request without locking
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self.lock:
+                if self._snapshot is None:
+                    data = self.get_dashboard_data()
+                    self._snapshot = (data['revision'], dumps_json(data))
+                snapshot = self._snapshot
+        return snapshot
+    
+    def get_chart_png(self):
+        """Return (revision, PNG bytes) for the price/P&L chart, rendering only after a state change"""
+        chart_png = self._chart_png
+        if chart_png is not None and chart_png[0] == self.revision:
+            return chart_png
+        
+        # Copy the series under the state lock, then render without holding it
+        with self._chart_lock:
+            with self.lock:
+                revision = self.revision
+                prices = np.array(self.price_history)
+                ma_values = np.array(self.ma_history)
+                price_times = np.array(self.price_times)
+                trades = self.trades
+            
+            self.chart.update_plot(prices, ma_values, trades, price_times)
+            self._chart_png = (revision, self.chart.get_png())
+            return self._chart_png
+    
     def get_dashboard_data(self):
         """Get current dashboard data"""
         # Portfolio stats
@@ -207,21 +324,36 @@ class WebTradingDashboard:
             'portfolio_value': portfolio_value,
             'total_pnl': total_pnl,
             'position': self.position,
-            'price_history': self.price_history[-50:],  # Last 50 points
-            'ma_history': self.ma_history[-50:],
-            'trades': self.trades[-20:],  # Last 20 trades
+            'price_history': list(self.recent_prices),  # Last 50 points
+            'ma_history': list(self.recent_ma),
+            'trades': self.trades.to_dicts(-DASHBOARD_TRADES),  # Last 20 trades
             'total_trades': len(self.trades),
             'csv_file': self.csv_filename,
             'auto_trading': self.auto_trading,
             'ma_period': self.ma_period,
             'slippage_rate': self.slippage_rate,
-            'fetch_interval': self.fetch_interval
+            'fetch_interval': self.fetch_interval,
+            'revision': self.revision
         }
 
 # Initialize dashboard
 dashboard = WebTradingDashboard()
 dashboard.load_existing_data()
 
+@app.after_request
+def add_cache_headers(response):
+    """
+    Make GET API responses revalidate on every poll
+    Routes that know the state revision set it as their ETag; the rest get a hash of the body,
+    and a matching If-None-Match turns either into 304 Not Modified
+    """
+    if request.method == 'GET' and request.path.startswith('/api/'):
+        response.headers.setdefault('Cache-Control', 'no-cache')
+        if response.status_code == 200 and response.get_etag()[0] is None:
+            response.add_etag()
+            response.make_conditional(request)
+    return response
+
 @app.route('/')
 def index():
     """Main dashboard page"""
@@ -229,91 +361,149 @@ def index():
 
 @app.route('/api/data')
 def get_data():
-    """API endpoint for dashboard data"""
-    return jsonify(dashboard.get_dashboard_data())
+    """
+    API endpoint for dashboard data
+    The ETag is the state revision (prefixed with BOOT_ID); If-None-Match with the current one gets 304 Not Modified
+    """
+    etag = revision_etag(dashboard.revision)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)  # A 304 repeats the validator the 200 would have sent
+    else:
+        revision, body = dashboard.get_dashboard_payload()
+        response = json_response(body)
+        response.set_etag(revision_etag(revision))
+    return response
+
+@app.route('/api/chart.png')
+def get_chart():
+    """Server-rendered price/P&L chart; cached per revision like /api/data"""
+    etag = revision_etag(dashboard.revision)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        revision, png = dashboard.get_chart_png()
+        response = Response(png, mimetype='image/png')
+        response.set_etag(revision_etag(revision))
+    return response
 
 @app.route('/api/trades')
 def get_trades():
-    """API endpoint for trade history"""
+    """
+    API endpoint for trade history
+    Returns trades[since:since+limit]; clients pass the returned 'next' index as ?since to get only new trades
+    """
+    since = max(0, request.args.get('since', 0, type=int))
+    limit = max(0, min(MAX_TRADES_PAGE, request.args.get('limit', MAX_TRADES_PAGE, type=int)))
+    trades = dashboard.trades.to_dicts(since, since + limit)
+    return json_response(dumps_json({
+        'trades': trades,
+        'total_trades': len(dashboard.trades),
+        'next': since + len(trades)
+    }))
+
+def toggle_auto_trading(data):
+    """Control action: switch automatic trading on or off"""
+    dashboard.auto_trading = not dashboard.auto_trading
+    dashboard.invalidate_payload()
     return jsonify({
-        'trades': dashboard.trades,
-        'total_trades': len(dashboard.trades)
+        'success': True,
+        'auto_trading': dashboard.auto_trading,
+        'message': f"Auto trading {'enabled' if dashboard.auto_trading else 'disabled'}"
     })
 
-@app.route('/api/control', methods=['POST'])
-def control_trading():
-    """API endpoint for trading controls"""
-    data = request.json
-    action = data.get('action')
-    
-    if action == 'toggle_auto_trading':
-        dashboard.auto_trading = not dashboard.auto_trading
+def manual_buy(data):
+    """Control action: buy SOL with all available cash"""
+    if dashboard.position == 'cash' and dashboard.current_price > 0:
+        dashboard.execute_trade('buy')
         return jsonify({
             'success': True,
-            'auto_trading': dashboard.auto_trading,
-            'message': f"Auto trading {'enabled' if dashboard.auto_trading else 'disabled'}"
+            'message': 'Manual BUY order executed'
         })
-    
-    elif action == 'manual_buy':
-        if dashboard.position == 'cash' and dashboard.current_price > 0:
-            dashboard.execute_trade('buy')
-            return jsonify({
-                'success': True,
-                'message': 'Manual BUY order executed'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Cannot buy: Already holding SOL or no price data'
-            })
-    
-    elif action == 'manual_sell':
-        if dashboard.position == 'sol' and dashboard.current_price > 0:
-            dashboard.execute_trade('sell')
-            return jsonify({
-                'success': True,
-                'message': 'Manual SELL order executed'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Cannot sell: No SOL holdings or no price data'
-            })
-    
-    elif action == 'update_settings':
-        if 'ma_period' in data:
-            dashboard.ma_period = max(5, min(50, int(data['ma_period'])))
-        if 'slippage_rate' in data:
-            dashboard.slippage_rate = max(0.001, min(0.01, float(data['slippage_rate'])))
-        if 'fetch_interval' in data:
-            dashboard.fetch_interval = max(10, min(300, int(data['fetch_interval'])))
-        
+    return jsonify({
+        'success': False,
+        'message': 'Cannot buy: Already holding SOL or no price data'
+    })
+
+def manual_sell(data):
+    """Control action: sell all SOL holdings"""
+    if dashboard.position == 'sol' and dashboard.current_price > 0:
+        dashboard.execute_trade('sell')
         return jsonify({
             'success': True,
-            'message': 'Settings updated successfully',
-            'settings': {
-                'ma_period': dashboard.ma_period,
-                'slippage_rate': dashboard.slippage_rate,
-                'fetch_interval': dashboard.fetch_interval
-            }
+            'message': 'Manual SELL order executed'
         })
+    return jsonify({
+        'success': False,
+        'message': 'Cannot sell: No SOL holdings or no price data'
+    })
+
+def update_settings(data):
+    """Control action: update MA period, slippage rate and fetch interval"""
+    if 'ma_period' in data:
+        ma_period = max(5, min(50, int(data['ma_period'])))
+        if ma_period != dashboard.ma_period:
+            dashboard.ma_period = ma_period
+            dashboard._ma.reset(ma_period, dashboard.price_history)  # Re-seed from recent prices
+    if 'slippage_rate' in data:
+        dashboard.slippage_rate = max(0.001, min(0.01, float(data['slippage_rate'])))
+    if 'fetch_interval' in data:
+        dashboard.fetch_interval = max(10, min(300, int(data['fetch_interval'])))
+        dashboard._reschedule.set()
+    dashboard.invalidate_payload()
     
-    elif action == 'reset_portfolio':
-        dashboard.portfolio = Portfolio(10000)
-        dashboard.position = 'cash'
-        dashboard.trades = []
-        dashboard.csv_filename = None
+    return jsonify({
+        'success': True,
+        'message': 'Settings updated successfully',
+        'settings': {
+            'ma_period': dashboard.ma_period,
+            'slippage_rate': dashboard.slippage_rate,
+            'fetch_interval': dashboard.fetch_interval
+        }
+    })
+
+def reset_portfolio(data):
+    """Control action: start over with a fresh $10,000 portfolio"""
+    dashboard.portfolio = Portfolio(10000)
+    dashboard.position = 'cash'
+    dashboard.trades = TradeLog()
+    dashboard.close_csv_file()
+    dashboard.csv_filename = None  # Next trade starts a new log file
+    dashboard.invalidate_payload()
+    return jsonify({
+        'success': True,
+        'message': 'Portfolio reset to $10,000'
+    })
+
+# Handlers for /api/control, keyed by the request's 'action'
+CONTROL_ACTIONS = {
+    'toggle_auto_trading': toggle_auto_trading,
+    'manual_buy': manual_buy,
+    'manual_sell': manual_sell,
+    'update_settings': update_settings,
+    'reset_portfolio': reset_portfolio
+}
+
+@app.route('/api/control', methods=['POST'])
+def control_trading():
+    """API endpoint for trading controls"""
+    data = request.json
+    handler = CONTROL_ACTIONS.get(data.get('action'))
+    if handler is None:
         return jsonify({
-            'success': True,
-            'message': 'Portfolio reset to $10,000'
+            'success': False,
+            'message': 'Unknown action'
         })
     
-    return jsonify({
-        'success': False,
-        'message': 'Unknown action'
-    })
+    # Checks and actions run under the lock so they can't interleave with auto trading
+    with dashboard.lock:
+        return handler(data)
 
 if __name__ == '__main__':
     print("Starting SOL/USDC Trading Dashboard...")
     print("Dashboard will be available at: http://localhost:5000")
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    if serve is not None:
+        serve(app, host='0.0.0.0', port=5000, threads=8)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file